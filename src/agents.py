@@ -81,7 +81,10 @@ def analysis_agent(ctx: AgentContext) -> AgentContext:
     
     csv_path = ctx.store.csv_path
     graph_json_path = DATA_DIR / "graph_data.json"
-    
+
+    # Reports render on the store's background worker; flush so the
+    # analysis reads this run's graph data rather than a stale file.
+    ctx.store.flush_reports()
     result = analyze_with_llamaindex(csv_path, graph_json_path)
     
     if result:
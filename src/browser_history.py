@@ -1,17 +1,76 @@
 from __future__ import annotations
 
+import configparser
 import datetime as dt
+import functools
+import heapq
+import itertools
 import os
-import shutil
+import re
 import sqlite3
-import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
-from urllib.parse import urlparse, parse_qs
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote_plus
 import socket
 
 from .storage import BrowserEntry
 
+# Lightweight row carried between the DB readers and final materialization:
+# (source, url, title, visit_time as Unix microseconds).
+RawVisit = Tuple[str, str, Optional[str], int]
+
+# Offset between the Chromium epoch (1601-01-01) and the Unix epoch, in
+# microseconds; used to normalize Chromium timestamps in SQL.
+_CHROMIUM_EPOCH_UNIX_US = 11_644_473_600_000_000
+
+# Naive-UTC Unix epoch, matching the naive utcnow() datetimes used for the
+# `since` cutoffs.
+_UNIX_EPOCH = dt.datetime(1970, 1, 1)
+
+# SELECT statements are fixed per schema; build the two variants (with and
+# without a `since` cutoff) once instead of f-string-assembling per call.
+# Keyed by bool(since).
+_SQL_CHROMIUM = {
+    False: f"""
+        SELECT urls.url, urls.title,
+               visits.visit_time - {_CHROMIUM_EPOCH_UNIX_US}
+        FROM urls
+        JOIN visits ON urls.id = visits.url
+        ORDER BY visits.visit_time DESC
+        LIMIT ?
+    """,
+    True: f"""
+        SELECT urls.url, urls.title,
+               visits.visit_time - {_CHROMIUM_EPOCH_UNIX_US}
+        FROM urls
+        JOIN visits ON urls.id = visits.url
+        WHERE visits.visit_time >= ?
+        ORDER BY visits.visit_time DESC
+        LIMIT ?
+    """,
+}
+
+_SQL_FIREFOX = {
+    False: """
+        SELECT moz_places.url, moz_places.title, moz_historyvisits.visit_date
+        FROM moz_places
+        JOIN moz_historyvisits ON moz_places.id = moz_historyvisits.place_id
+        ORDER BY moz_historyvisits.visit_date DESC
+        LIMIT ?
+    """,
+    True: """
+        SELECT moz_places.url, moz_places.title, moz_historyvisits.visit_date
+        FROM moz_places
+        JOIN moz_historyvisits ON moz_places.id = moz_historyvisits.place_id
+        WHERE moz_historyvisits.visit_date >= ?
+        ORDER BY moz_historyvisits.visit_date DESC
+        LIMIT ?
+    """,
+}
+
 
 def _win_localappdata() -> Path | None:
     raw = os.environ.get("LOCALAPPDATA")
@@ -50,8 +109,12 @@ KNOWN_HISTORY_PATHS: Dict[str, Tuple[Path, ...]] = {
 }
 
 
+@functools.lru_cache(maxsize=1)
 def _resolve_local_ip() -> str | None:
-    """Best-effort local IP detection without external calls."""
+    """Best-effort local IP detection without external calls.
+
+    Cached for the process lifetime so concurrent backends share one lookup.
+    """
     try:
         # Uses system routing table to pick the primary interface.
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -68,20 +131,62 @@ def _resolve_local_ip() -> str | None:
 def fetch_browser_history(
     browsers: Iterable[str], since: dt.datetime | None = None, max_rows: int = 10000
 ) -> List[BrowserEntry]:
-    entries: List[BrowserEntry] = []
     normalized = {b.lower() for b in browsers}
+    tasks: List[Callable[[], List[RawVisit]]] = []
     if "chrome" in normalized:
-        entries.extend(_read_chromium_like("chrome", since, max_rows))
+        tasks.append(functools.partial(_read_chromium_like, "chrome", since, max_rows))
     if "edge" in normalized:
-        entries.extend(_read_chromium_like("edge", since, max_rows))
+        tasks.append(functools.partial(_read_chromium_like, "edge", since, max_rows))
     if "firefox" in normalized:
-        entries.extend(_read_firefox(since, max_rows))
-    entries.sort(key=lambda entry: entry.visit_time, reverse=True)
-    return entries[:max_rows] if max_rows else entries
+        tasks.append(functools.partial(_read_firefox, since, max_rows))
+    if not tasks:
+        return []
+
+    # The backends hit independent files; sqlite3 releases the GIL, so
+    # running them in threads overlaps the I/O.
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        results = list(executor.map(lambda task: task(), tasks))
+
+    # Each backend's SQL already returns rows newest-first (ORDER BY ...
+    # DESC LIMIT), so a k-way merge gives the global newest-first order in
+    # O(N) instead of re-sorting everything. The merge compares plain ints.
+    merged = heapq.merge(*results, key=itemgetter(3), reverse=True)
+    if max_rows:
+        merged = itertools.islice(merged, max_rows)
+    return _materialize(merged)
 
 
+def _materialize(rows: Iterable[RawVisit]) -> List[BrowserEntry]:
+    """Build BrowserEntry objects for the rows that survived the top-K cut.
+
+    Query extraction and timestamp decoding only happen here, so rows
+    discarded by the merge never pay for them.
+    """
+    ip = _resolve_local_ip()
+    # Local bindings keep the hot loop free of module-global lookups.
+    entry = BrowserEntry
+    to_dt = _unix_us_to_dt
+    extract = _extract_query
+    return [
+        entry(
+            source=source,
+            url=url,
+            title=title,
+            visit_time=to_dt(visit_us),
+            query=extract(url),
+            ip=ip,
+        )
+        for source, url, title, visit_us in rows
+    ]
+
+
+@functools.lru_cache(maxsize=None)
 def _chromium_profile_candidates(source: str) -> Tuple[Path, ...]:
-    """Return possible History DB locations for Chromium-based browsers."""
+    """Return possible History DB locations for Chromium-based browsers.
+
+    Cached per source: the profile directory layout does not change within
+    a run, and the scan stats every subdirectory.
+    """
     if source == "chrome":
         bases = [
             Path.home() / ".config" / "google-chrome",
@@ -119,7 +224,7 @@ def _chromium_profile_candidates(source: str) -> Tuple[Path, ...]:
 
 def _read_chromium_like(
     source: str, since: dt.datetime | None, max_rows: int
-) -> List[BrowserEntry]:
+) -> List[RawVisit]:
     paths = KNOWN_HISTORY_PATHS.get(source, ())
     for db_path in paths:
         if db_path.exists():
@@ -134,54 +239,123 @@ def _read_chromium_like(
     return []
 
 
+def _snapshot_to_memory(db_path: Path) -> sqlite3.Connection:
+    """Copy a history DB into memory with the online backup API.
+
+    The backup API holds its own shared lock for the copy, so the snapshot
+    is always consistent even while the browser is writing — at the cost of
+    reading the whole file once. No on-disk copy is made.
+    """
+    src_conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        src_conn.backup(conn)
+    finally:
+        src_conn.close()
+    return conn
+
+
+def _open_history_ro(db_path: Path) -> sqlite3.Connection:
+    """Open a browser history DB read-only without copying it.
+
+    The immutable/nolock flags let SQLite read the file in place even while
+    the browser holds its own locks; if the open itself fails, fall back to
+    an in-memory snapshot. In-place reads can also fail later, at query
+    time, which _query_history handles.
+    """
+    try:
+        conn = sqlite3.connect(
+            f"file:{db_path}?mode=ro&immutable=1&nolock=1",
+            uri=True,
+            check_same_thread=False,
+        )
+    except sqlite3.OperationalError:
+        conn = _snapshot_to_memory(db_path)
+    _apply_read_pragmas(conn)
+    return conn
+
+
+# Long-lived read-only connection per history DB. Reusing the connection
+# keeps the PRAGMA setup and SQLite's page cache across calls; a plain dict
+# (rather than lru_cache) so a connection that starts failing can be
+# evicted. check_same_thread is off because each DB is read from whichever
+# pool worker picks up its backend.
+_CONN_CACHE: Dict[str, sqlite3.Connection] = {}
+_CONN_LOCK = threading.Lock()
+
+
+def _get_readonly_conn(db_path_str: str) -> sqlite3.Connection:
+    with _CONN_LOCK:
+        conn = _CONN_CACHE.get(db_path_str)
+        if conn is None:
+            conn = _CONN_CACHE[db_path_str] = _open_history_ro(Path(db_path_str))
+        return conn
+
+
+def _drop_readonly_conn(db_path_str: str) -> None:
+    with _CONN_LOCK:
+        conn = _CONN_CACHE.pop(db_path_str, None)
+    if conn is not None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def _query_history(db_path: Path, sql: str, params: Tuple[object, ...]) -> List[tuple]:
+    """Run a history query, retrying via a backup snapshot on failure.
+
+    Reading a live DB in place with immutable=1 can surface SQLITE_BUSY or
+    a torn-read SQLITE_CORRUPT at execute time while the browser writes or
+    checkpoints its WAL. In that case drop the cached connection and rerun
+    the query against a consistent in-memory snapshot.
+    """
+    try:
+        return _get_readonly_conn(str(db_path)).execute(sql, params).fetchall()
+    except sqlite3.DatabaseError:
+        _drop_readonly_conn(str(db_path))
+        conn = _snapshot_to_memory(db_path)
+        try:
+            _apply_read_pragmas(conn)
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+
+def _apply_read_pragmas(conn: sqlite3.Connection) -> None:
+    """Tune a read-only history connection.
+
+    mmap lets SQLite map the hot pages straight from the page cache instead
+    of streaming them through read(); the larger cache and in-memory temp
+    store keep the ORDER BY/LIMIT sort off disk.
+    """
+    cur = conn.cursor()
+    cur.execute("PRAGMA query_only=1")
+    cur.execute("PRAGMA mmap_size=268435456")
+    cur.execute("PRAGMA cache_size=-65536")
+    cur.execute("PRAGMA temp_store=MEMORY")
+
+
 def _read_chromium_db(
     source: str, db_path: Path, since: dt.datetime | None, max_rows: int
-) -> List[BrowserEntry]:
-    temp_path = Path(tempfile.mkstemp(suffix=".db")[1])
-    ip = _resolve_local_ip()
+) -> List[RawVisit]:
     try:
-        shutil.copy2(db_path, temp_path)
-        where_clause = ""
         params: Tuple[object, ...]
         if since:
-            where_clause = "WHERE visits.visit_time >= ?"
             params = (_chromium_dt_to_ts(since), max_rows)
         else:
             params = (max_rows,)
-        query = f"""
-            SELECT urls.url, urls.title, visits.visit_time
-            FROM urls
-            JOIN visits ON urls.id = visits.url
-            {where_clause}
-            ORDER BY visits.visit_time DESC
-            LIMIT ?
-        """
-        with sqlite3.connect(f"file:{temp_path}?mode=ro", uri=True) as conn:
-            cur = conn.cursor()
-            rows = cur.execute(query, params).fetchall()
-            return [
-                BrowserEntry(
-                    source=source,
-                    url=row[0],
-                    title=row[1],
-                    visit_time=_chromium_ts_to_dt(row[2]),
-                    query=_extract_query(row[0]),
-                    ip=ip,
-                )
-                for row in rows
-            ]
+        # The SQL projects the timestamp as Unix microseconds so rows from
+        # all browsers compare directly in the merge.
+        rows = _query_history(db_path, _SQL_CHROMIUM[bool(since)], params)
+        return [(source, url, title, visit_us) for url, title, visit_us in rows]
     except sqlite3.Error:
         return []
-    finally:
-        try:
-            temp_path.unlink()
-        except FileNotFoundError:
-            pass
 
 
 def _read_firefox(
     since: dt.datetime | None, max_rows: int
-) -> List[BrowserEntry]:
+) -> List[RawVisit]:
     profiles_ini = Path.home() / ".mozilla" / "firefox" / "profiles.ini"
     if not profiles_ini.exists():
         win_profiles = (_win_appdata() / "Mozilla/Firefox/profiles.ini") if _win_appdata() else None
@@ -190,13 +364,18 @@ def _read_firefox(
         else:
             return []
 
-    profile_dirs = [
-        line.split("=", 1)[1].strip()
-        for line in profiles_ini.read_text().splitlines()
-        if line.lower().startswith("path=")
-    ]
-
-    ip = _resolve_local_ip()
+    # Parse with configparser so only real [ProfileN] Path keys are picked
+    # up, instead of prefix-matching every line in the file. profiles.ini is
+    # not an interpolated config — a literal % in a profile path must not
+    # raise when the value is read.
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        parser.read(profiles_ini)
+        profile_dirs = [
+            section["Path"] for section in parser.values() if "Path" in section
+        ]
+    except configparser.Error:
+        return []
 
     for profile in profile_dirs:
         # Prefer Linux-style path; fall back to Windows profile location.
@@ -210,74 +389,49 @@ def _read_firefox(
                 db_path = alt
             else:
                 continue
-        temp_path = Path(tempfile.mkstemp(suffix=".db")[1])
         try:
-            shutil.copy2(db_path, temp_path)
-            where_clause = ""
             params: Tuple[object, ...]
             if since:
-                where_clause = "WHERE moz_historyvisits.visit_date >= ?"
                 params = (_firefox_dt_to_ts(since), max_rows)
             else:
                 params = (max_rows,)
-            query = f"""
-                SELECT moz_places.url, moz_places.title, moz_historyvisits.visit_date
-                FROM moz_places
-                JOIN moz_historyvisits ON moz_places.id = moz_historyvisits.place_id
-                {where_clause}
-                ORDER BY moz_historyvisits.visit_date DESC
-                LIMIT ?
-            """
-            with sqlite3.connect(f"file:{temp_path}?mode=ro", uri=True) as conn:
-                cur = conn.cursor()
-                rows = cur.execute(query, params).fetchall()
-                return [
-                    BrowserEntry(
-                        source="firefox",
-                        url=row[0],
-                        title=row[1],
-                        visit_time=_firefox_ts_to_dt(row[2]),
-                        query=_extract_query(row[0]),
-                        ip=ip,
-                    )
-                    for row in rows
-                ]
+            # moz_historyvisits.visit_date is already Unix microseconds.
+            rows = _query_history(db_path, _SQL_FIREFOX[bool(since)], params)
+            return [("firefox", url, title, visit_us) for url, title, visit_us in rows]
         except sqlite3.Error:
             return []
-        finally:
-            try:
-                temp_path.unlink()
-            except FileNotFoundError:
-                pass
     return []
 
 
-def _chromium_ts_to_dt(value: int) -> dt.datetime:
-    # Chromium stores microseconds since 1601-01-01
-    epoch_start = dt.datetime(1601, 1, 1)
-    return epoch_start + dt.timedelta(microseconds=value)
+def _unix_us_to_dt(value: int) -> dt.datetime:
+    # Both readers normalize timestamps to microseconds since the Unix epoch.
+    return dt.datetime.utcfromtimestamp(value / 1_000_000)
 
 
-def _chromium_dt_to_ts(value: dt.datetime) -> int:
-    epoch_start = dt.datetime(1601, 1, 1)
-    delta = value - epoch_start
-    return int(delta.total_seconds() * 1_000_000)
+def _dt_to_unix_us(value: dt.datetime) -> int:
+    # Pure integer arithmetic — total_seconds() goes through a float and
+    # loses microsecond precision on large offsets.
+    delta = value - _UNIX_EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
 
 
-def _firefox_ts_to_dt(value: int) -> dt.datetime:
-    # Firefox uses microseconds since Unix epoch
-    return dt.datetime.utcfromtimestamp(value / 1_000_000)
+def _chromium_dt_to_ts(value: dt.datetime) -> int:
+    return _dt_to_unix_us(value) + _CHROMIUM_EPOCH_UNIX_US
 
 
 def _firefox_dt_to_ts(value: dt.datetime) -> int:
-    return int(value.timestamp() * 1_000_000)
+    return _dt_to_unix_us(value)
+
+
+# Search-term parameters we recognize, in order of preference.
+_QUERY_RE = re.compile(r"[?&](?:q|query|text)=([^&#]*)")
 
 
 def _extract_query(url: str) -> str | None:
-    parsed = urlparse(url)
-    qs = parse_qs(parsed.query)
-    for key in ("q", "query", "text"):
-        if key in qs:
-            return qs[key][0]
+    # One regex scan beats urlparse + parse_qs, which decode every
+    # parameter just so we can read a single key.
+    match = _QUERY_RE.search(url)
+    if match:
+        return unquote_plus(match.group(1))
     return None
 
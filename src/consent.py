@@ -5,13 +5,19 @@ from typing import Dict
 from .storage import AuditLogger
 
 
+# Accepted answers, built once instead of per prompt iteration.
+_YES = frozenset({"y", "yes"})
+_NO = frozenset({"", "n", "no"})
+
+
 def prompt_yes_no(question: str) -> bool:
     """Simple CLI consent prompt."""
+    prompt = f"{question} [y/N]: "
     while True:
-        answer = input(f"{question} [y/N]: ").strip().lower()
-        if answer in {"y", "yes"}:
+        answer = input(prompt).strip().lower()
+        if answer in _YES:
             return True
-        if answer in {"", "n", "no"}:
+        if answer in _NO:
             return False
         print("Please answer with 'y' or 'n'.")
 
@@ -22,16 +28,34 @@ def prompt_llamaindex_analysis() -> bool:
 
 
 def collect_consents(audit: AuditLogger) -> Dict[str, bool]:
-    """Ask for explicit consent per resource."""
+    """Ask for explicit consent per resource.
+
+    All questions are shown up front and answered with one y/n string
+    (e.g. 'nny'), so the user waits on a single prompt instead of three;
+    anything unparseable falls back to asking per resource.
+    """
     prompts = {
         "gmail": "Allow read-only Gmail access via OAuth?",
         "filesystem": "Allow read-only local filesystem scan (for config/paths)?",
         "browser_history": "Allow read-only browser history ingestion (Chrome/Firefox/Edge)?",
     }
+    keys = list(prompts)
+    for index, key in enumerate(keys, start=1):
+        print(f"{index}. {prompts[key]}")
+    answer = (
+        input(f"Enter y/n for each of the {len(keys)} questions (e.g. 'nny'), or leave blank to answer one by one: ")
+        .strip()
+        .lower()
+    )
+
     decisions: Dict[str, bool] = {}
-    for key, question in prompts.items():
-        allowed = prompt_yes_no(question)
-        decisions[key] = allowed
+    if len(answer) == len(keys) and set(answer) <= {"y", "n"}:
+        for key, char in zip(keys, answer):
+            decisions[key] = char == "y"
+    else:
+        for key in keys:
+            decisions[key] = prompt_yes_no(prompts[key])
+    for key, allowed in decisions.items():
         audit.log("consent", f"{key}={'granted' if allowed else 'declined'}")
     return decisions
 
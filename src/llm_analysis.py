@@ -1,15 +1,31 @@
 from __future__ import annotations
 
 import csv
+import functools
+import hashlib
 import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional
 
 from .storage import DATA_DIR
 
+try:
+    # Optional: C-level JSON parsing, several times faster than stdlib.
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
 
+
+@functools.lru_cache(maxsize=1)
 def check_llamaindex_available() -> bool:
-    """Check if LlamaIndex is installed and available."""
+    """Check if LlamaIndex is installed and available.
+
+    Cached — the import alone costs hundreds of ms and the pipeline asks
+    more than once per run.
+    """
     try:
         import llama_index
         return True
@@ -17,8 +33,13 @@ def check_llamaindex_available() -> bool:
         return False
 
 
+@functools.lru_cache(maxsize=1)
 def _get_llm_model():
-    """Get LLM model for LlamaIndex - uses HuggingFace or Ollama."""
+    """Get LLM model for LlamaIndex - uses HuggingFace or Ollama.
+
+    Memoized so repeated analyses in one session reuse the loaded model
+    instead of paying the multi-second model load again.
+    """
     import os
     
     # Try HuggingFace first (for local models or inference API)
@@ -111,6 +132,37 @@ def call_llamaindex(prompt: str) -> Optional[str]:
         return None
 
 
+LLM_CACHE_DIR = DATA_DIR / "llm_cache"
+
+
+def _cached_analysis_path(prompt: str) -> Path:
+    key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return LLM_CACHE_DIR / f"{key}.txt"
+
+
+def _load_cached_analysis(prompt: str) -> Optional[str]:
+    cache_path = _cached_analysis_path(prompt)
+    try:
+        if cache_path.exists():
+            return cache_path.read_text(encoding="utf-8")
+    except OSError:
+        pass
+    return None
+
+
+def _store_cached_analysis(prompt: str, result: str) -> None:
+    cache_path = _cached_analysis_path(prompt)
+    try:
+        LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so a crash never leaves a truncated entry.
+        fd, tmp_name = tempfile.mkstemp(dir=LLM_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(result)
+        os.replace(tmp_name, cache_path)
+    except OSError:
+        pass
+
+
 def read_query_data_from_csv(csv_path: Path) -> List[str]:
     """Extract query column data from browser_history.csv."""
     queries = []
@@ -119,14 +171,17 @@ def read_query_data_from_csv(csv_path: Path) -> List[str]:
     
     try:
         with csv_path.open("r", encoding="utf-8", newline="") as handle:
-            reader = csv.DictReader(handle)
-            for row in reader:
-                query = row.get("query", "").strip()
-                if query:
-                    queries.append(query)
+            reader = csv.reader(handle)
+            header = next(reader, None)
+            if not header or "query" not in header:
+                return queries
+            qi = header.index("query")
+            # Plain csv.reader avoids DictReader's per-row dict just to
+            # pull a single column.
+            queries = [row[qi].strip() for row in reader if len(row) > qi and row[qi].strip()]
     except Exception as e:
         print(f"Error reading CSV queries: {e}")
-    
+
     return queries
 
 
@@ -136,8 +191,8 @@ def read_graph_data(json_path: Path) -> Optional[Dict]:
         return None
     
     try:
-        with json_path.open("r", encoding="utf-8") as handle:
-            return json.load(handle)
+        # Bytes in, parsed dict out — orjson only accepts bytes/str.
+        return _json_loads(json_path.read_bytes())
     except Exception as e:
         print(f"Error reading graph data: {e}")
         return None
@@ -149,7 +204,9 @@ def format_analysis_prompt(query_data: List[str], graph_data: Optional[Dict]) ->
     # Format query data
     query_section = "## Search Query Data:\n"
     if query_data:
-        unique_queries = list(set(query_data))[:100]  # Limit to top 100 unique queries
+        # Single-pass dedupe that keeps first-seen order (a set would
+        # shuffle queries by hash and copy the full list first).
+        unique_queries = list(dict.fromkeys(query_data))[:100]  # Limit to top 100 unique queries
         query_section += "\n".join(f"- {q}" for q in unique_queries[:50])  # Show first 50
         if len(unique_queries) > 50:
             query_section += f"\n... and {len(unique_queries) - 50} more unique queries.\n"
@@ -219,17 +276,28 @@ def analyze_with_llamaindex(
         return None
     
     print("Extracting data for analysis...")
-    query_data = read_query_data_from_csv(csv_path)
-    graph_data = read_graph_data(graph_json_path)
+    # The CSV and JSON reads are independent file I/O; overlap them.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        query_future = executor.submit(read_query_data_from_csv, csv_path)
+        graph_future = executor.submit(read_graph_data, graph_json_path)
+        query_data = query_future.result()
+        graph_data = graph_future.result()
     
     if not query_data and not graph_data:
         print("No data available for analysis.")
         return None
     
     print(f"Found {len(query_data)} search queries and graph data.")
-    print("Sending data to LlamaIndex for analysis...")
-    
+
     prompt = format_analysis_prompt(query_data, graph_data)
+    cached = _load_cached_analysis(prompt)
+    if cached is not None:
+        print("Reusing cached analysis for unchanged data.")
+        return cached
+
+    print("Sending data to LlamaIndex for analysis...")
     result = call_llamaindex(prompt)
-    
+    if result:
+        _store_cached_analysis(prompt, result)
+
     return result
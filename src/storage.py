@@ -1,204 +1,119 @@
 from __future__ import annotations
 
+import atexit
 from dataclasses import dataclass
+import heapq
 from pathlib import Path
+import queue
 import sqlite3
+import threading
 from typing import Iterable, List, Optional
 import csv
 import datetime as dt
 import html as html_lib
 import json
-from collections import Counter
+import os
+import re
+import tempfile
+import time
+from collections import Counter, defaultdict
+from operator import itemgetter
 from urllib.parse import urlparse
 
+try:
+    # Optional: C-level JSON serialization for the Chart.js payloads, which
+    # can run to thousands of hosts; stdlib json is the fallback.
+    import orjson
+
+    def _jdumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    def _jdumps(obj) -> str:
+        return json.dumps(obj, separators=(",", ":"))
+
+
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
 
+# Minimum seconds between report re-renders; saves inside the window only
+# mark the reports dirty.
+RENDER_INTERVAL = 5.0
 
-@dataclass
-class BrowserEntry:
-    source: str
-    url: str
-    title: Optional[str]
-    visit_time: dt.datetime
-    query: Optional[str] = None
-    ip: Optional[str] = None
+# Cap on rows rendered into the HTML table; keeps the document loadable and
+# the per-render cost constant regardless of history size.
+MAX_HTML_ROWS = 5000
 
+# Read-only default for hosts with no weekday data.
+_EMPTY_WEEK = (0,) * 7
 
-class LocalStore:
-    """Local SQLite + CSV storage."""
+# Most-visited hosts embedded in the analysis page; the selector UI shows
+# at most 50 of them anyway.
+_ANALYSIS_TOP_N = 200
 
-    def __init__(
-        self,
-        db_path: Path | None = None,
-        csv_path: Path | None = None,
-        html_path: Path | None = None,
-        analysis_path: Path | None = None,
-    ) -> None:
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
-        self.db_path = db_path or DATA_DIR / "ctn.sqlite"
-        self.csv_path = csv_path or DATA_DIR / "browser_history.csv"
-        self.html_path = html_path or DATA_DIR / "browser_history.html"
-        self.analysis_path = analysis_path or DATA_DIR / "analyze.html"
-        self._ensure_db()
+# Characters html.escape would touch; most cells (URLs, timestamps, hosts)
+# contain none of them, so a single scan skips the four replace passes.
+_NEEDS_ESCAPE_RE = re.compile(r"[&<>\"']")
 
-    def _ensure_db(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS browser_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    source TEXT NOT NULL,
-                    url TEXT NOT NULL,
-                    title TEXT,
-                    visit_time TEXT NOT NULL,
-                    query TEXT,
-                    ip TEXT
-                )
-                """
-            )
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS audit_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    event TEXT NOT NULL,
-                    detail TEXT
-                )
-                """
-            )
-            conn.commit()
 
-    def save_browser_history(self, entries: Iterable[BrowserEntry]) -> int:
-        rows: List[BrowserEntry] = list(entries)
-        if not rows:
-            return 0
+def _escape_cell(val: str) -> str:
+    if _NEEDS_ESCAPE_RE.search(val):
+        return html_lib.escape(val, quote=True)
+    return val
 
-        with sqlite3.connect(self.db_path) as conn:
-            cur = conn.cursor()
-            cur.executemany(
-                """
-                INSERT INTO browser_history (source, url, title, visit_time, query, ip)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                [
-                    (
-                        row.source,
-                        row.url,
-                        row.title,
-                        row.visit_time.isoformat(),
-                        row.query,
-                        row.ip,
-                    )
-                    for row in rows
-                ],
-            )
-            conn.commit()
 
-        self._append_csv(rows)
-        self._write_html()
-        self._write_analysis_html()
-        self._export_graph_data_json()
-        return len(rows)
+# scheme://[userinfo@]host[:port]... — group 1 is the bare host. Matching
+# this directly skips urlparse's full SplitResult construction per URL.
+_HOST_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.\-]*://(?:[^/?#@]*@)?([^/?#:]+)")
 
-    def _append_csv(self, rows: List[BrowserEntry]) -> None:
-        is_new = not self.csv_path.exists()
-        with self.csv_path.open("a", newline="", encoding="utf-8") as handle:
-            writer = csv.writer(handle)
-            if is_new:
-                writer.writerow(["source", "url", "title", "visit_time", "query", "ip"])
-            for row in rows:
-                writer.writerow(
-                    [
-                        row.source,
-                        row.url,
-                        row.title or "",
-                        row.visit_time.isoformat(),
-                        row.query or "",
-                        row.ip or "",
-                    ]
-                )
 
-    def _write_html(self) -> None:
-        """Render a simple HTML table from the CSV export for easy viewing."""
-        if not self.csv_path.exists():
-            return
+def _extract_host(url: str) -> str:
+    match = _HOST_RE.match(url)
+    if match:
+        return match.group(1).lower()
+    # Fallback for exotic forms (scheme-relative, bare paths, etc.).
+    return (urlparse(url).hostname or "") if url else ""
 
-        with self.csv_path.open("r", encoding="utf-8", newline="") as handle:
-            reader = csv.reader(handle)
-            rows = list(reader)
+_INSERT_SQL = """
+    INSERT OR IGNORE INTO browser_history (source, url, title, visit_time, query, ip, host, dow)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
 
-        if not rows:
-            return
+# Column order shared by the CSV export, the in-memory row cache and the
+# HTML table.
+_EXPORT_COLUMNS = ("source", "url", "title", "visit_time", "query", "ip")
 
-        header, *body = rows
-        header_lower = [col.strip().lower() for col in header]
-
-        desired_order = ["source", "url", "title", "visit_time", "query", "ip"]
-        ordered_indices = [header_lower.index(col) for col in desired_order if col in header_lower]
-        display_header = [header[i] for i in ordered_indices] if ordered_indices else header
-
-        def cell(col_name: str, val: str) -> str:
-            """Render table cell; make URL fields clickable."""
-            safe_val = html_lib.escape(val or "")
-            if col_name == "url" and val:
-                safe_href = html_lib.escape(val, quote=True)
-                return f'<a href="{safe_href}" target="_blank" rel="noopener noreferrer">{safe_val}</a>'
-            return safe_val
-
-        def ordered_row(row: List[str]) -> List[str]:
-            if not ordered_indices:
-                return row
-            return [row[i] if i < len(row) else "" for i in ordered_indices]
-
-        html_rows = "\n".join(
-            "<tr>"
-            + "".join(
-                f"<td>{cell(col_name, col_val)}</td>"
-                for col_name, col_val in zip(
-                    (col.lower() for col in display_header), ordered_row(row)
-                )
-            )
-            + "</tr>"
-            for row in body
-        )
-        html_header = "".join(f"<th>{html_lib.escape(col)}</th>" for col in display_header)
-
-        colgroup = """
-    <col style="width: 12%" />
-    <col style="width: 34%" />
-    <col style="width: 20%" />
-    <col style="width: 14%" />
-    <col style="width: 12%" />
-    <col style="width: 8%" />
-"""
+# Position of the url column within _EXPORT_COLUMNS rows (linkified in HTML).
+_URL_COL = _EXPORT_COLUMNS.index("url")
+
+# Static parts of the history-table document, built once at import. Only the
+# <tbody> rows vary between renders.
+_HTML_HEADER_CELLS = "".join(f"<th>{html_lib.escape(col)}</th>" for col in _EXPORT_COLUMNS)
 
-        html_doc = f"""<!DOCTYPE html>
+_HTML_PREFIX = """<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta charset="UTF-8" />
   <meta name="viewport" content="width=device-width, initial-scale=1.0" />
   <title>Browser History Export</title>
   <style>
-    body {{
+    body {
       font-family: Arial, sans-serif;
       margin: 24px;
       color: #111;
       background: #f7f7f7;
-    }}
-    h1 {{
+    }
+    h1 {
       text-align: center;
       margin-bottom: 16px;
-    }}
-    table {{
+    }
+    table {
       width: 100%;
       border-collapse: collapse;
       background: #fff;
       box-shadow: 0 1px 4px rgba(0,0,0,0.08);
       table-layout: fixed;
-    }}
-    th, td {{
+    }
+    th, td {
       padding: 10px 12px;
       border: 1px solid #e0e0e0;
       text-align: left;
@@ -207,123 +122,44 @@ class LocalStore:
       word-wrap: break-word;
       overflow: hidden;
       text-overflow: ellipsis;
-    }}
-    th {{
+    }
+    th {
       background: #fafafa;
       font-weight: 600;
-    }}
-    tr:nth-child(even) {{
+    }
+    tr:nth-child(even) {
       background: #fcfcfc;
-    }}
+    }
   </style>
 </head>
 <body>
   <h1>Browser History Export</h1>
-  <table>
+"""
+
+_HTML_TABLE_OPEN = """  <table>
     <colgroup>
-      {colgroup}
+      <col style="width: 12%" />
+      <col style="width: 34%" />
+      <col style="width: 20%" />
+      <col style="width: 14%" />
+      <col style="width: 12%" />
+      <col style="width: 8%" />
     </colgroup>
-    <thead><tr>{html_header}</tr></thead>
+    <thead><tr>""" + _HTML_HEADER_CELLS + """</tr></thead>
     <tbody>
-      {html_rows}
+"""
+
+_HTML_SUFFIX = """
     </tbody>
   </table>
 </body>
 </html>
 """
 
-        with self.html_path.open("w", encoding="utf-8") as handle:
-            handle.write(html_doc)
-
-    def _aggregate_domains(self) -> tuple[Counter, Counter, dict[str, Counter], Counter]:
-        """Return counters for subdomains (full host), TLDs, per-day-of-week usage, and total day-of-week counts."""
-        if not self.csv_path.exists():
-            return Counter(), Counter(), {}, Counter()
-
-        with self.csv_path.open("r", encoding="utf-8", newline="") as handle:
-            reader = csv.DictReader(handle)
-            subdomains: Counter = Counter()
-            tlds: Counter = Counter()
-            dow_by_subdomain: dict[str, Counter] = {}
-            dow_total: Counter = Counter()
-            for row in reader:
-                url = row.get("url") or ""
-                host = urlparse(url).hostname or ""
-                if not host:
-                    continue
-                subdomains[host] += 1
-                parts = host.split(".")
-                if len(parts) >= 2:
-                    tlds[parts[-1]] += 1
-                elif parts:
-                    tlds[parts[0]] += 1
-                # Day-of-week aggregation
-                visit_raw = row.get("visit_time") or ""
-                try:
-                    ts = dt.datetime.fromisoformat(visit_raw)
-                    dow = ts.weekday()  # 0=Mon
-                except (ValueError, TypeError):
-                    continue
-                if host not in dow_by_subdomain:
-                    dow_by_subdomain[host] = Counter()
-                dow_by_subdomain[host][dow] += 1
-                dow_total[dow] += 1
-        return subdomains, tlds, dow_by_subdomain, dow_total
-
-    def _write_analysis_html(self) -> None:
-        """Render a chart view summarizing frequent subdomains, TLDs, and day-of-week usage."""
-        subdomains, tlds, dow_by_subdomain, dow_total = self._aggregate_domains()
-
-        # Get all subdomains sorted by count (for selection UI)
-        all_subdomains = subdomains.most_common()
-        sub_labels_all = [label for label, _ in all_subdomains]
-        sub_counts_all = [count for _, count in all_subdomains]
-
-        # Take top 20 for initial display
-        top_subdomains = subdomains.most_common(20)
-        sub_labels = [label for label, _ in top_subdomains]
-        sub_counts = [count for _, count in top_subdomains]
-        tld_labels = [label for label, _ in tlds.most_common(20)]
-        tld_counts = [count for _, count in tlds.most_common(20)]
-
-        # Prepare full day-of-week data for all subdomains
-        dow_labels = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-        # Store all subdomain day-of-week data
-        all_dow_data = {}
-        for sub in sub_labels_all:
-            counts = [dow_by_subdomain.get(sub, Counter()).get(i, 0) for i in range(7)]
-            all_dow_data[sub] = counts
-
-        # Initial day-of-week dataset (top 8)
-        dow_subdomains_initial = sub_labels[:8]
-        palette = [
-            "#4F46E5",
-            "#0EA5E9",
-            "#10B981",
-            "#F59E0B",
-            "#EF4444",
-            "#8B5CF6",
-            "#EC4899",
-            "#06B6D4",
-            "#14B8A6",
-            "#F97316",
-            "#84CC16",
-            "#A855F7",
-            "#E11D48",
-            "#3B82F6",
-            "#22C55E",
-            "#FBBF24",
-        ]
-
-        total_dow_counts = [dow_total.get(i, 0) for i in range(7)]
-
-        # Generate checkbox HTML for subdomain selection
-        checkbox_html = ""
-        for idx, (sub, count) in enumerate(all_subdomains[:50]):  # Show top 50 in selector
-            checked = "checked" if sub in sub_labels[:8] else ""
-            checkbox_html += f'<label style="display: inline-block; margin: 4px 8px; min-width: 200px;"><input type="checkbox" class="subdomain-checkbox" value="{html_lib.escape(sub)}" {checked}> {html_lib.escape(sub)} ({count})</label>'
-
-        html_doc = f"""<!DOCTYPE html>
+# Static skeleton of the analysis page, built once at import. Each render
+# only substitutes the /*MARKER*/null payloads and the checkbox block —
+# no multi-KB f-string parsing or brace-escaping per call.
+_ANALYSIS_TEMPLATE = """<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta charset="UTF-8" />
@@ -331,36 +167,36 @@ class LocalStore:
   <title>Domain Usage Analysis</title>
   <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
   <style>
-    body {{
+    body {
       font-family: Arial, sans-serif;
       margin: 24px;
       background: #f7f7f7;
       color: #111;
-    }}
-    h1, h2 {{
+    }
+    h1, h2 {
       text-align: center;
-    }}
-    .chart-container {{
+    }
+    .chart-container {
       width: 100%;
       max-width: 960px;
       margin: 24px auto;
       background: #fff;
       padding: 16px;
       box-shadow: 0 1px 4px rgba(0,0,0,0.08);
-    }}
-    .selector-container {{
+    }
+    .selector-container {
       width: 100%;
       max-width: 960px;
       margin: 24px auto;
       background: #fff;
       padding: 16px;
       box-shadow: 0 1px 4px rgba(0,0,0,0.08);
-    }}
-    .selector-controls {{
+    }
+    .selector-controls {
       margin-bottom: 12px;
       text-align: center;
-    }}
-    .selector-controls button {{
+    }
+    .selector-controls button {
       margin: 0 8px;
       padding: 6px 16px;
       background: #4F46E5;
@@ -369,25 +205,25 @@ class LocalStore:
       border-radius: 4px;
       cursor: pointer;
       font-size: 14px;
-    }}
-    .selector-controls button:hover {{
+    }
+    .selector-controls button:hover {
       background: #4338CA;
-    }}
-    .checkbox-container {{
+    }
+    .checkbox-container {
       max-height: 300px;
       overflow-y: auto;
       border: 1px solid #e0e0e0;
       padding: 12px;
       border-radius: 4px;
-    }}
-    .checkbox-container label {{
+    }
+    .checkbox-container label {
       display: block;
       padding: 4px 0;
       cursor: pointer;
-    }}
-    .checkbox-container label:hover {{
+    }
+    .checkbox-container label:hover {
       background: #f5f5f5;
-    }}
+    }
   </style>
 </head>
 <body>
@@ -400,7 +236,7 @@ class LocalStore:
       <button onclick="selectTop8()">Select Top 8</button>
     </div>
     <div class="checkbox-container">
-      {checkbox_html}
+      <!--CHECKBOXES-->
     </div>
   </div>
   <div class="chart-container">
@@ -422,216 +258,627 @@ class LocalStore:
 
   <script>
     // Store all data
-    const allSubLabels = {json.dumps(sub_labels_all)};
-    const allSubCounts = {json.dumps(sub_counts_all)};
-    const allDowData = {json.dumps(all_dow_data)};
-    const tldLabels = {json.dumps(tld_labels)};
-    const tldCounts = {json.dumps(tld_counts)};
-    const dowLabels = {json.dumps(dow_labels)};
-    const dowTotals = {json.dumps(total_dow_counts)};
+    const allSubLabels = /*ALL_SUB_LABELS*/null;
+    const allSubCounts = /*ALL_SUB_COUNTS*/null;
+    const allDowData = /*ALL_DOW_DATA*/null;
+    const tldLabels = /*TLD_LABELS*/null;
+    const tldCounts = /*TLD_COUNTS*/null;
+    const dowLabels = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"];
+    const dowTotals = /*DOW_TOTALS*/null;
     
-    const palette = {json.dumps(palette)};
+    const palette = ["#4F46E5","#0EA5E9","#10B981","#F59E0B","#EF4444","#8B5CF6","#EC4899","#06B6D4","#14B8A6","#F97316","#84CC16","#A855F7","#E11D48","#3B82F6","#22C55E","#FBBF24"];
     
     // Chart instances
     let subdomainChart = null;
     let dowChart = null;
 
+    // Host -> position in allSubLabels, built once for O(1) lookups.
+    const subIndex = new Map(allSubLabels.map((sub, i) => [sub, i]));
+
     // Get selected subdomains
-    function getSelectedSubdomains() {{
+    function getSelectedSubdomains() {
       const checkboxes = document.querySelectorAll('.subdomain-checkbox:checked');
       return Array.from(checkboxes).map(cb => cb.value);
-    }}
+    }
     
     // Update charts based on selection
-    function updateCharts() {{
+    function updateCharts() {
       const selected = getSelectedSubdomains();
       
       // Update subdomain chart
       const filteredLabels = [];
       const filteredCounts = [];
-      selected.forEach(sub => {{
-        const idx = allSubLabels.indexOf(sub);
-        if (idx !== -1) {{
+      selected.forEach(sub => {
+        const idx = subIndex.get(sub);
+        if (idx !== undefined) {
           filteredLabels.push(sub);
           filteredCounts.push(allSubCounts[idx]);
-        }}
-      }});
+        }
+      });
       
-      if (subdomainChart) {{
+      if (subdomainChart) {
         subdomainChart.data.labels = filteredLabels;
         subdomainChart.data.datasets[0].data = filteredCounts;
         subdomainChart.update();
-      }}
+      }
       
       // Update day-of-week chart
       const dowDatasets = [];
-      selected.forEach((sub, idx) => {{
-        if (allDowData[sub]) {{
-          dowDatasets.push({{
+      selected.forEach((sub, idx) => {
+        if (allDowData[sub]) {
+          dowDatasets.push({
             label: sub,
             data: allDowData[sub],
             backgroundColor: palette[idx % palette.length],
             stack: 'dow',
-          }});
-        }}
-      }});
+          });
+        }
+      });
       
-      // Calculate "Other" counts
+      // Calculate "Other" counts in a single sweep; Set membership is
+      // O(1) vs Array.includes scanning the selection per host.
+      const selectedSet = new Set(selected);
       const otherCounts = [0, 0, 0, 0, 0, 0, 0];
-      allSubLabels.forEach(sub => {{
-        if (!selected.includes(sub) && allDowData[sub]) {{
-          for (let i = 0; i < 7; i++) {{
+      allSubLabels.forEach(sub => {
+        if (!selectedSet.has(sub) && allDowData[sub]) {
+          for (let i = 0; i < 7; i++) {
             otherCounts[i] += allDowData[sub][i];
-          }}
-        }}
-      }});
+          }
+        }
+      });
       
-      if (otherCounts.some(x => x > 0)) {{
-        dowDatasets.push({{
+      if (otherCounts.some(x => x > 0)) {
+        dowDatasets.push({
           label: 'Other',
           data: otherCounts,
           backgroundColor: '#9CA3AF',
           stack: 'dow',
-        }});
-      }}
+        });
+      }
       
-      if (dowChart) {{
+      if (dowChart) {
         dowChart.data.datasets = dowDatasets;
         dowChart.update();
-      }}
-    }}
+      }
+    }
     
     // Selection helper functions
-    function selectAll() {{
+    function selectAll() {
       document.querySelectorAll('.subdomain-checkbox').forEach(cb => cb.checked = true);
       updateCharts();
-    }}
+    }
     
-    function deselectAll() {{
+    function deselectAll() {
       document.querySelectorAll('.subdomain-checkbox').forEach(cb => cb.checked = false);
       updateCharts();
-    }}
+    }
     
-    function selectTop8() {{
+    function selectTop8() {
       deselectAll();
-      const top8 = allSubLabels.slice(0, 8);
-      document.querySelectorAll('.subdomain-checkbox').forEach(cb => {{
-        if (top8.includes(cb.value)) {{
+      const top8 = new Set(allSubLabels.slice(0, 8));
+      document.querySelectorAll('.subdomain-checkbox').forEach(cb => {
+        if (top8.has(cb.value)) {
           cb.checked = true;
-        }}
-      }});
+        }
+      });
       updateCharts();
-    }}
+    }
     
     // Initialize charts
-    const barOptions = {{
+    const barOptions = {
       indexAxis: 'y',
-      plugins: {{
-        legend: {{ display: false }},
-        tooltip: {{ enabled: true }},
-      }},
-      scales: {{
-        x: {{ beginAtZero: true, title: {{ display: true, text: 'Visits' }} }},
-        y: {{ title: {{ display: true, text: 'Host / TLD' }} }}
-      }}
-    }};
-
-    subdomainChart = new Chart(document.getElementById('subdomainChart'), {{
+      plugins: {
+        legend: { display: false },
+        tooltip: { enabled: true },
+      },
+      scales: {
+        x: { beginAtZero: true, title: { display: true, text: 'Visits' } },
+        y: { title: { display: true, text: 'Host / TLD' } }
+      }
+    };
+
+    subdomainChart = new Chart(document.getElementById('subdomainChart'), {
       type: 'bar',
-      data: {{
-        labels: {json.dumps(sub_labels[:8])},
-        datasets: [{{
+      data: {
+        labels: /*TOP_SUB_LABELS*/null,
+        datasets: [{
           label: 'Visits',
-          data: {json.dumps(sub_counts[:8])},
+          data: /*TOP_SUB_COUNTS*/null,
           backgroundColor: '#4F46E5',
-        }}],
-      }},
+        }],
+      },
       options: barOptions,
-    }});
+    });
 
-    new Chart(document.getElementById('tldChart'), {{
+    new Chart(document.getElementById('tldChart'), {
       type: 'bar',
-      data: {{
+      data: {
         labels: tldLabels,
-        datasets: [{{
+        datasets: [{
           label: 'Visits',
           data: tldCounts,
           backgroundColor: '#0EA5E9',
-        }}],
-      }},
+        }],
+      },
       options: barOptions,
-    }});
+    });
 
-    dowChart = new Chart(document.getElementById('dowChart'), {{
+    dowChart = new Chart(document.getElementById('dowChart'), {
       type: 'bar',
-      data: {{
+      data: {
         labels: dowLabels,
         datasets: [],
-      }},
-      options: {{
+      },
+      options: {
         responsive: true,
-        plugins: {{
-          legend: {{ position: 'bottom' }},
-          tooltip: {{ mode: 'index', intersect: false }},
-        }},
-        scales: {{
-          x: {{ stacked: true }},
-          y: {{ stacked: true, beginAtZero: true, title: {{ display: true, text: 'Visits' }} }},
-        }},
-      }},
-    }});
-
-    new Chart(document.getElementById('dowTotalChart'), {{
+        plugins: {
+          legend: { position: 'bottom' },
+          tooltip: { mode: 'index', intersect: false },
+        },
+        scales: {
+          x: { stacked: true },
+          y: { stacked: true, beginAtZero: true, title: { display: true, text: 'Visits' } },
+        },
+      },
+    });
+
+    new Chart(document.getElementById('dowTotalChart'), {
       type: 'bar',
-      data: {{
+      data: {
         labels: dowLabels,
-        datasets: [{{
+        datasets: [{
           label: 'Visits',
           data: dowTotals,
           backgroundColor: '#6366F1',
-        }}],
-      }},
-      options: {{
+        }],
+      },
+      options: {
         responsive: true,
-        plugins: {{
-          legend: {{ display: false }},
-          tooltip: {{ mode: 'index', intersect: false }},
-        }},
-        scales: {{
-          x: {{ beginAtZero: true }},
-          y: {{ beginAtZero: true, title: {{ display: true, text: 'Visits' }} }},
-        }},
-      }},
-    }});
+        plugins: {
+          legend: { display: false },
+          tooltip: { mode: 'index', intersect: false },
+        },
+        scales: {
+          x: { beginAtZero: true },
+          y: { beginAtZero: true, title: { display: true, text: 'Visits' } },
+        },
+      },
+    });
     
     // Add event listeners to checkboxes
-    document.addEventListener('DOMContentLoaded', function() {{
-      document.querySelectorAll('.subdomain-checkbox').forEach(cb => {{
+    document.addEventListener('DOMContentLoaded', function() {
+      document.querySelectorAll('.subdomain-checkbox').forEach(cb => {
         cb.addEventListener('change', updateCharts);
-      }});
+      });
       // Initial update
       updateCharts();
-    }});
+    });
   </script>
 </body>
 </html>
 """
 
+
+@dataclass(slots=True, frozen=True)
+class BrowserEntry:
+    source: str
+    url: str
+    title: Optional[str]
+    visit_time: dt.datetime
+    query: Optional[str] = None
+    ip: Optional[str] = None
+
+
+class LocalStore:
+    """Local SQLite + CSV storage."""
+
+    def __init__(
+        self,
+        db_path: Path | None = None,
+        csv_path: Path | None = None,
+        html_path: Path | None = None,
+        analysis_path: Path | None = None,
+    ) -> None:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path or DATA_DIR / "ctn.sqlite"
+        self.csv_path = csv_path or DATA_DIR / "browser_history.csv"
+        self.html_path = html_path or DATA_DIR / "browser_history.html"
+        self.analysis_path = analysis_path or DATA_DIR / "analyze.html"
+        # One connection for the store's lifetime: opening per save costs
+        # file open + pragma setup and throws away SQLite's page cache.
+        self._conn = sqlite3.connect(
+            self.db_path, isolation_level=None, check_same_thread=False
+        )
+        # Lets SQL aggregate by host without round-tripping rows to Python.
+        self._conn.create_function("hostname", 1, _extract_host, deterministic=True)
+        # The connection is shared across threads (check_same_thread=False);
+        # serialize writers and state updates ourselves.
+        self._lock = threading.Lock()
+        # Held for the duration of a render so two renderers never
+        # interleave writes to the same output files.
+        self._render_lock = threading.Lock()
+        self._reports_dirty = False
+        self._last_render = 0.0
+        # Domain counters are kept in memory and updated per batch so the
+        # analysis views never rescan the whole history.
+        self._subdomains: Counter = Counter()
+        self._tlds: Counter = Counter()
+        # Per-host weekday counts as plain 7-slot lists (index 0=Mon):
+        # thousands of tiny Counter objects cost far more per increment,
+        # and defaultdict folds the get-or-create branch into one lookup.
+        self._dow_by_subdomain: defaultdict[str, list[int]] = defaultdict(lambda: [0] * 7)
+        self._dow_total: Counter = Counter()
+        # All rows as export-ready string tuples (in _EXPORT_COLUMNS order)
+        # so rendering never re-reads the CSV.
+        self._all_rows: List[tuple] = []
+        # (url, visit_time) keys already stored, mirroring the unique index
+        # so duplicate batches are dropped before touching the CSV/counters.
+        self._seen: set[tuple[str, str]] = set()
+        # Checked once here instead of a stat per append.
+        self._csv_has_header = self.csv_path.exists() and self.csv_path.stat().st_size > 0
+        self._ensure_db()
+        self._load_aggregates()
+        # Rendering happens off the save path: saves drop a token into this
+        # single-slot queue and the worker re-renders. A full queue means a
+        # render is already pending and will pick the new rows up anyway.
+        self._render_queue: queue.Queue = queue.Queue(maxsize=1)
+        self._render_thread = threading.Thread(
+            target=self._render_worker, name="localstore-render", daemon=True
+        )
+        self._render_thread.start()
+        # The worker is a daemon thread; flush whatever is still dirty when
+        # the process exits so short CLI runs always leave fresh reports.
+        atexit.register(self.flush_reports)
+
+    def close(self) -> None:
+        """Render any pending reports and release the SQLite connection."""
+        self.flush_reports()
+        with self._lock:
+            self._conn.close()
+
+    def _ensure_db(self) -> None:
+        cur = self._conn.cursor()
+        # WAL + relaxed sync avoid a journal rewrite and multiple fsyncs
+        # per batch; journal_mode persists on the DB file.
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA cache_size=-65536")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS browser_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                url TEXT NOT NULL,
+                title TEXT,
+                visit_time TEXT NOT NULL,
+                query TEXT,
+                ip TEXT,
+                host TEXT,
+                dow INTEGER
+            )
+            """
+        )
+        # host/dow are derived from immutable row data, so they are computed
+        # once at insert time; migrate DBs created before the columns existed.
+        columns = {row[1] for row in cur.execute("PRAGMA table_info(browser_history)")}
+        if "host" not in columns:
+            cur.execute("ALTER TABLE browser_history ADD COLUMN host TEXT")
+        if "dow" not in columns:
+            cur.execute("ALTER TABLE browser_history ADD COLUMN dow INTEGER")
+        # Backfill legacy rows (0=Monday, shifting strftime's 0=Sunday).
+        cur.execute(
+            """
+            UPDATE browser_history
+            SET host = hostname(url),
+                dow = (CAST(strftime('%w', visit_time) AS INTEGER) + 6) % 7
+            WHERE host IS NULL
+            """
+        )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS ix_history_host_dow"
+            " ON browser_history(host, dow)"
+        )
+        # Re-ingesting a browser profile used to pile up duplicate rows;
+        # drop any accumulated ones once so the unique guard can be built,
+        # then let INSERT OR IGNORE keep the table deduplicated.
+        cur.execute(
+            """
+            DELETE FROM browser_history
+            WHERE id NOT IN (
+                SELECT MIN(id) FROM browser_history GROUP BY url, visit_time
+            )
+            """
+        )
+        cur.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_history"
+            " ON browser_history(url, visit_time)"
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS audit_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                event TEXT NOT NULL,
+                detail TEXT
+            )
+            """
+        )
+
+    def save_browser_history(self, entries: Iterable[BrowserEntry]) -> int:
+        rows: List[BrowserEntry] = list(entries)
+        if not rows:
+            return 0
+
+        with self._lock:
+            return self._save_locked(rows)
+
+    def _save_locked(self, rows: List[BrowserEntry]) -> int:
+        # Serialize each row once; the insert, the CSV export, the row cache
+        # and the counters all reuse the same tuples (isoformat and host
+        # extraction are the costly parts). Rows whose (url, visit_time)
+        # key is already stored are dropped here so re-ingested history
+        # never reaches the CSV or the counters; the unique index backs
+        # this up at the SQL level.
+        seen = self._seen
+        serialized = []
+        for row in rows:
+            visit_iso = row.visit_time.isoformat()
+            key = (row.url, visit_iso)
+            if key in seen:
+                continue
+            seen.add(key)
+            serialized.append(
+                (
+                    row.source,
+                    row.url,
+                    row.title,
+                    visit_iso,
+                    row.query,
+                    row.ip,
+                    _extract_host(row.url),
+                    row.visit_time.weekday(),
+                )
+            )
+        if not serialized:
+            return 0
+
+        cur = self._conn.cursor()
+        # One write transaction for the whole batch; IMMEDIATE takes the
+        # write lock up front instead of upgrading mid-batch.
+        before = self._conn.total_changes
+        cur.execute("BEGIN IMMEDIATE")
+        cur.executemany(_INSERT_SQL, serialized)
+        self._conn.commit()
+        inserted = self._conn.total_changes - before
+
+        display = [
+            (source, url, title or "", visit_iso, query or "", ip or "")
+            for source, url, title, visit_iso, query, ip, _host, _dow in serialized
+        ]
+        self._append_csv(display)
+        self._update_aggregates(serialized)
+        self._all_rows.extend(display)
+        # Hand rendering to the background worker so the caller only pays
+        # for the insert and the CSV append.
+        self._reports_dirty = True
+        try:
+            self._render_queue.put_nowait(True)
+        except queue.Full:
+            pass
+        return inserted
+
+    def _render_worker(self) -> None:
+        while True:
+            self._render_queue.get()
+            # Rate-limit background renders; saves landing in the meantime
+            # coalesce into the single pending queue slot.
+            wait = RENDER_INTERVAL - (time.monotonic() - self._last_render)
+            if wait > 0:
+                time.sleep(wait)
+            self.flush_reports()
+
+    def flush_reports(self) -> None:
+        """Re-render the HTML/JSON exports if anything changed since last render.
+
+        Snapshots the rows and counters under the state lock and renders
+        outside it, so a save landing mid-render only waits for the copy,
+        not for the whole render.
+        """
+        with self._render_lock:
+            with self._lock:
+                if not self._reports_dirty:
+                    return
+                rows = list(self._all_rows)
+                subdomains = self._subdomains.copy()
+                tlds = self._tlds.copy()
+                dow_by_subdomain = {
+                    host: list(week) for host, week in self._dow_by_subdomain.items()
+                }
+                dow_total = self._dow_total.copy()
+                self._reports_dirty = False
+            self._write_html(rows)
+            self._write_analysis_html(subdomains, tlds, dow_by_subdomain, dow_total)
+            self._export_graph_data_json(subdomains, dow_by_subdomain, dow_total)
+            self._last_render = time.monotonic()
+
+    def _append_csv(self, display_rows: List[tuple]) -> None:
+        """Append pre-serialized rows (in _EXPORT_COLUMNS order) to the CSV."""
+        # 256 KiB buffer: large batches flush in a few write() calls instead
+        # of one per 8 KiB default buffer fill.
+        with self.csv_path.open("a", newline="", encoding="utf-8", buffering=1 << 18) as handle:
+            writer = csv.writer(handle)
+            if not self._csv_has_header:
+                writer.writerow(_EXPORT_COLUMNS)
+                self._csv_has_header = True
+            # writerows loops in C instead of one writerow call per entry.
+            writer.writerows(display_rows)
+
+    def _write_html(self, rows: List[tuple]) -> None:
+        """Render a simple HTML table of the given history rows."""
+        total = len(rows)
+        if not total:
+            return
+        # Most recent rows only; rendering the full history produces
+        # multi-MB documents browsers struggle to open. The cache is in
+        # insert order (batches arrive newest-first), so pick the window by
+        # visit_time — ISO strings compare chronologically — rather than by
+        # position, and render it newest-first to match the banner.
+        by_visit = itemgetter(3)
+        if total > MAX_HTML_ROWS:
+            body = heapq.nlargest(MAX_HTML_ROWS, rows, key=by_visit)
+        else:
+            body = sorted(rows, key=by_visit, reverse=True)
+
+        # Stream rows straight to the (large-buffered) file instead of
+        # materializing the whole tbody string first; peak memory stays at
+        # one row regardless of table size. Bindings hoisted out of the
+        # loop: no per-cell closure call and no per-row zip.
+        esc = _escape_cell
+        url_col = _URL_COL
+        with self.html_path.open("w", encoding="utf-8", buffering=1 << 18) as handle:
+            write = handle.write
+            write(_HTML_PREFIX)
+            if total > len(body):
+                write(
+                    f'  <p style="text-align: center">Showing the most recent {len(body)} of {total} entries.</p>\n'
+                )
+            write(_HTML_TABLE_OPEN)
+            for row in body:
+                parts = ["<tr>"]
+                append = parts.append
+                for idx, val in enumerate(row):
+                    safe_val = esc(val) if val else ""
+                    if idx == url_col and val:
+                        append(
+                            f'<td><a href="{safe_val}" target="_blank"'
+                            f' rel="noopener noreferrer">{safe_val}</a></td>'
+                        )
+                    else:
+                        append("<td>")
+                        append(safe_val)
+                        append("</td>")
+                append("</tr>\n")
+                write("".join(parts))
+            write(_HTML_SUFFIX)
+
+    def _load_aggregates(self) -> None:
+        """Rehydrate the domain counters and row cache from SQLite once at startup."""
+        cur = self._conn.execute(
+            "SELECT source, url, title, visit_time, query, ip FROM browser_history"
+        )
+        for source, url, title, visit_raw, query, ip in cur:
+            self._all_rows.append((source, url, title or "", visit_raw, query or "", ip or ""))
+            self._seen.add((url, visit_raw))
+        # Counters come from one grouped, index-backed query over the
+        # precomputed host/dow columns — no URL or timestamp parsing at all.
+        cur = self._conn.execute(
+            "SELECT host, dow, COUNT(*) FROM browser_history GROUP BY host, dow"
+        )
+        for host, dow, count in cur:
+            if not host:
+                continue
+            self._subdomains[host] += count
+            parts = host.split(".")
+            if len(parts) >= 2:
+                self._tlds[parts[-1]] += count
+            elif parts:
+                self._tlds[parts[0]] += count
+            if dow is None:
+                continue
+            self._dow_by_subdomain[host][dow] += count
+            self._dow_total[dow] += count
+
+    def _update_aggregates(self, serialized: List[tuple]) -> None:
+        """Fold newly saved rows into the cached counters.
+
+        Takes the insert tuples so the host/dow computed at serialization
+        time are reused instead of re-derived.
+        """
+        for row in serialized:
+            self._account_visit(row[6], row[7])
+
+    def _account_visit(self, host: str, dow: Optional[int]) -> None:
+        if not host:
+            return
+        self._subdomains[host] += 1
+        parts = host.split(".")
+        if len(parts) >= 2:
+            self._tlds[parts[-1]] += 1
+        elif parts:
+            self._tlds[parts[0]] += 1
+        if dow is None:
+            return
+        self._dow_by_subdomain[host][dow] += 1
+        self._dow_total[dow] += 1
+
+    def _write_analysis_html(
+        self,
+        subdomains: Counter,
+        tlds: Counter,
+        dow_by_subdomain: dict[str, list[int]],
+        dow_total: Counter,
+    ) -> None:
+        """Render a chart view summarizing frequent subdomains, TLDs, and day-of-week usage."""
+        # Get top subdomains sorted by count (for selection UI). The page
+        # only ever shows 50 in the selector and 8 by default, so shipping
+        # every host would just bloat the document on heavy-tail histories.
+        all_subdomains = subdomains.most_common(_ANALYSIS_TOP_N)
+        sub_labels_all = [label for label, _ in all_subdomains]
+        sub_counts_all = [count for _, count in all_subdomains]
+
+        # Take top 20 for initial display
+        top_subdomains = subdomains.most_common(20)
+        sub_labels = [label for label, _ in top_subdomains]
+        sub_counts = [count for _, count in top_subdomains]
+        tld_labels = [label for label, _ in tlds.most_common(20)]
+        tld_counts = [count for _, count in tlds.most_common(20)]
+
+        # Full day-of-week data for the shipped subdomains (labels and the
+        # color palette are baked into the template).
+        all_dow_data = {}
+        for sub in sub_labels_all:
+            counts = list(dow_by_subdomain.get(sub) or _EMPTY_WEEK)
+            all_dow_data[sub] = counts
+
+        total_dow_counts = [dow_total.get(i, 0) for i in range(7)]
+
+        # Generate checkbox HTML for subdomain selection
+        checkbox_html = ""
+        for idx, (sub, count) in enumerate(all_subdomains[:50]):  # Show top 50 in selector
+            checked = "checked" if sub in sub_labels[:8] else ""
+            checkbox_html += f'<label style="display: inline-block; margin: 4px 8px; min-width: 200px;"><input type="checkbox" class="subdomain-checkbox" value="{html_lib.escape(sub)}" {checked}> {html_lib.escape(sub)} ({count})</label>'
+
+        doc = (
+            _ANALYSIS_TEMPLATE
+            .replace("<!--CHECKBOXES-->", checkbox_html)
+            .replace("/*ALL_SUB_LABELS*/null", _jdumps(sub_labels_all))
+            .replace("/*ALL_SUB_COUNTS*/null", _jdumps(sub_counts_all))
+            .replace("/*ALL_DOW_DATA*/null", _jdumps(all_dow_data))
+            .replace("/*TLD_LABELS*/null", _jdumps(tld_labels))
+            .replace("/*TLD_COUNTS*/null", _jdumps(tld_counts))
+            .replace("/*DOW_TOTALS*/null", _jdumps(total_dow_counts))
+            .replace("/*TOP_SUB_LABELS*/null", _jdumps(sub_labels[:8]))
+            .replace("/*TOP_SUB_COUNTS*/null", _jdumps(sub_counts[:8]))
+        )
+
         with self.analysis_path.open("w", encoding="utf-8") as handle:
-            handle.write(html_doc)
+            handle.write(doc)
 
-    def _export_graph_data_json(self) -> None:
+    def _export_graph_data_json(
+        self,
+        subdomains: Counter,
+        dow_by_subdomain: dict[str, list[int]],
+        dow_total: Counter,
+    ) -> None:
         """Export graph data as JSON for LLM analysis."""
-        import json
-        subdomains, tlds, dow_by_subdomain, dow_total = self._aggregate_domains()
-        
         # Format day-of-week data for selected subdomains (top 20)
         all_subdomains = subdomains.most_common(20)
         dow_data = {}
         dow_labels = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
         
         for subdomain, count in all_subdomains:
-            dow_counts = [dow_by_subdomain.get(subdomain, Counter()).get(i, 0) for i in range(7)]
+            dow_counts = list(dow_by_subdomain.get(subdomain) or _EMPTY_WEEK)
             dow_data[subdomain] = {
                 "total_visits": count,
                 "day_of_week": {dow_labels[i]: dow_counts[i] for i in range(7)}
@@ -644,8 +891,12 @@ class LocalStore:
         }
         
         graph_json_path = DATA_DIR / "graph_data.json"
-        with graph_json_path.open("w", encoding="utf-8") as handle:
+        # Write-then-rename so the analysis step, which reads this file as
+        # soon as it runs, never sees a torn half-written document.
+        fd, tmp_name = tempfile.mkstemp(dir=DATA_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
             json.dump(graph_data, handle, indent=2)
+        os.replace(tmp_name, graph_json_path)
 
 
 class AuditLogger:
@@ -654,12 +905,24 @@ class AuditLogger:
     def __init__(self, log_path: Path | None = None) -> None:
         DATA_DIR.mkdir(parents=True, exist_ok=True)
         self.log_path = log_path or DATA_DIR / "audit.log"
+        # One O_APPEND handle for the logger's lifetime instead of an
+        # open/close pair per event; POSIX append writes stay atomic across
+        # processes. Line-buffered so an audit event reaches the page cache
+        # as soon as it is logged — this is an audit trail, so losing
+        # buffered events on a crash matters more than batching writes.
+        self._fh = self.log_path.open("a", encoding="utf-8", buffering=1)
+        atexit.register(self.close)
+
+    def close(self) -> None:
+        """Flush and release the log file handle."""
+        if not self._fh.closed:
+            self._fh.close()
 
     def log(self, event: str, detail: str | None = None) -> None:
-        timestamp = dt.datetime.utcnow().isoformat()
-        line = f"{timestamp}\t{event}"
-        if detail:
-            line = f"{line}\t{detail}"
-        with self.log_path.open("a", encoding="utf-8") as handle:
-            handle.write(line + "\n")
+        # now(timezone.utc) replaces the deprecated utcnow(); the line is
+        # built in one expression and written with a single call.
+        timestamp = dt.datetime.now(dt.timezone.utc).isoformat()
+        self._fh.write(
+            f"{timestamp}\t{event}\t{detail}\n" if detail else f"{timestamp}\t{event}\n"
+        )
 